@@ -0,0 +1,166 @@
+import asyncio
+import math
+import os
+import threading
+from collections import deque
+from starlette.responses import StreamingResponse
+
+
+class AdmissionLimiter:
+    #per-worker concurrency limit for one class of endpoints
+    #sync handlers are shed as soon as the class is at capacity, as waiting would park a thread of the
+    #Functions thread pool that other endpoints need. async handlers wait on a future in a bounded queue
+    #until a slot is handed to them or their deadline passes, which holds no thread
+
+    def __init__(self, name, concurrency, max_queue, timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = max(1, math.ceil(timeout))
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed_at_capacity = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def _admit(self):
+        #caller must hold the lock, queued requests are never overtaken
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        return False
+
+    def try_acquire(self):
+        #returns None once admitted, otherwise the reason the request was shed
+        with self._lock:
+            if self._admit():
+                return None
+            self.shed_at_capacity += 1
+            return "at_capacity"
+
+    async def acquire_async(self):
+        #returns None once admitted, otherwise the reason the request was shed
+        with self._lock:
+            if self._admit():
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self.shed_queue_full += 1
+                return "queue_full"
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter[1], self.timeout)
+            return None
+        except asyncio.TimeoutError:
+            with self._lock:
+                #if release already handed over the slot, _grant sees the cancelled future and gives it back
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self.shed_timeout += 1
+            return "timeout"
+
+    def release(self):
+        with self._lock:
+            #hand the slot straight to the oldest waiter, in_flight is unchanged
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                if future.done():
+                    continue
+                self.admitted += 1
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            self.in_flight -= 1
+
+    def _grant(self, future):
+        #runs on the waiter's event loop
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "maxQueue": self.max_queue,
+                "inFlight": self.in_flight,
+                "queueDepth": len(self._waiters),
+                "admitted": self.admitted,
+                "shedAtCapacity": self.shed_at_capacity,
+                "shedQueueFull": self.shed_queue_full,
+                "shedTimeout": self.shed_timeout
+            }
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    #streaming response that gives back its admission slot once the body has been sent or sending failed
+    #the handler returns before any of the streaming work, so releasing there would leave it unlimited
+
+    def __init__(self, response, limiter):
+        super().__init__(response.body_iterator, status_code=response.status_code, background=response.background)
+        self.raw_headers = response.raw_headers
+        self._limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._limiter.release()
+
+
+#size of the thread pool sync functions run on, as chosen by the Python worker
+def workerThreadCount():
+    configured = os.environ.get("PYTHON_THREADPOOL_THREAD_COUNT")
+    if configured:
+        return int(configured)
+    return min(32, (os.cpu_count() or 1) + 4)
+
+#splits the thread pool between endpoint classes so auth and writes can never hold every thread
+#sync handlers hold a pool thread only while admitted, as they are shed instead of queued, so at most
+#auth + writes threads are busy with those classes and the rest of the pool is always free for reads
+#worst case on a 1 vCPU plan: pool = min(32, 1 + 4) = 5, auth = 1, writes = 1, reads = 5 - 1 - 1 = 3,
+#so a login storm plus a write burst hold 2 threads and 3 remain for /v1.0/userEvents
+def defaultBudgets(threads):
+    auth = max(1, threads // 4)
+    writes = max(1, threads // 4)
+    reads = max(1, threads - auth - writes)
+    return {"auth": auth, "reads": reads, "writes": writes}
+
+
+#helper to build a limiter whose budget can be overridden with ADMISSION_<NAME>_* settings
+#overrides should keep auth + writes concurrency below the thread pool size
+def limiterFromEnv(name, concurrency, max_queue, timeout):
+    prefix = "ADMISSION_%s_" % name.upper()
+    return AdmissionLimiter(
+        name,
+        concurrency=int(os.environ.get(prefix + "CONCURRENCY", concurrency)),
+        max_queue=int(os.environ.get(prefix + "QUEUE", max_queue)),
+        timeout=float(os.environ.get(prefix + "TIMEOUT", timeout))
+    )
+
+
+#auth, reads and writes are sync handlers sized from the thread pool, so they never queue
+#bulk is the async export and import, which run on the event loop and hold their slot for a whole stream,
+#so they get a small budget of their own rather than a share of the pool the cheap endpoints need
+budgets = defaultBudgets(workerThreadCount())
+limiters = {
+    "auth": limiterFromEnv("auth", concurrency=budgets["auth"], max_queue=0, timeout=1.0),
+    "reads": limiterFromEnv("reads", concurrency=budgets["reads"], max_queue=0, timeout=1.0),
+    "writes": limiterFromEnv("writes", concurrency=budgets["writes"], max_queue=0, timeout=2.0),
+    "bulk": limiterFromEnv("bulk", concurrency=2, max_queue=4, timeout=5.0)
+}
+
+def admissionMetrics():
+    return {name: limiter.metrics() for name, limiter in limiters.items()}
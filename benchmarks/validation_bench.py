@@ -0,0 +1,46 @@
+#benchmark of the compiled event validators, run with: python benchmarks/validation_bench.py [count]
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import validateCreateEvent, validateEditEvent
+
+REPEATS = 5
+
+def makeEvents(count):
+    base = datetime(2026, 1, 1, 6, 0)
+    events = []
+    for i in range(count):
+        start = base + timedelta(hours=i)
+        events.append({
+            "eventType": "WORKOUT" if i % 2 else "STANDARD",
+            "title": "  Tempo run %d  " % i,
+            "description": "6 x 1km at threshold" if i % 3 else None,
+            "location": "Track" if i % 4 else "",
+            "start": start.isoformat() + "Z",
+            "end": (start + timedelta(minutes=45)).isoformat() + "Z",
+            "workoutLogId": "65a1f0c2e4b0a1b2c3d4e5f6" if i % 5 == 0 else None
+        })
+    return events
+
+def bench(name, validate, payloads):
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for payload in payloads:
+            validate(payload)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print("%-12s %6d events  %8.2f ms total  %6.2f us/event" % (
+        name, len(payloads), best * 1000, best * 1e6 / len(payloads)))
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    events = makeEvents(count)
+    edits = [{"title": event["title"], "end": event["end"]} for event in events]
+
+    bench("create", validateCreateEvent, events)
+    bench("edit", validateEditEvent, edits)
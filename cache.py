@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+
+
+#helper to normalise datetimes to naive UTC, the form pymongo hands back from the db
+def toUtcNaive(value):
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class EventWindowCache:
+    #per-worker LRU cache of serialized /userEvents responses
+    #keyed by (userId, from, to) and bounded by total bytes, number of entries and a TTL
+    #other workers and instances cannot invalidate this cache, so the TTL bounds how stale a window can get
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, max_entries=2048, ttl=30.0, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        #generations are bumped by every invalidate, so a read that raced a write is not stored
+        #the epoch changes when the generation table is reset, which makes every captured generation stale
+        self._generations = {}
+        self._epoch = 0
+
+    def _key(self, user_id, from_dt, to_dt):
+        return (str(user_id), toUtcNaive(from_dt), toUtcNaive(to_dt))
+
+    def generation(self, user_id):
+        #capture before reading from the db and pass to put
+        with self._lock:
+            return (self._epoch, self._generations.get(str(user_id), 0))
+
+    def get(self, user_id, from_dt, to_dt):
+        key = self._key(user_id, from_dt, to_dt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, expires_at = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def put(self, user_id, from_dt, to_dt, body, generation):
+        #bodies bigger than the whole budget are never cached
+        if len(body) > self.max_bytes:
+            return
+        key = self._key(user_id, from_dt, to_dt)
+        with self._lock:
+            #the user's events changed since the body was read, so it may already be stale
+            if generation != (self._epoch, self._generations.get(key[0], 0)):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, self._clock() + self.ttl)
+            self._by_user.setdefault(key[0], set()).add(key)
+            self._size += len(body)
+
+            #evicting least recently used entries until back within budget
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, user_id, start, end):
+        #drops the user's cached windows that overlap [start, end)
+        user = str(user_id)
+        start = toUtcNaive(start)
+        end = toUtcNaive(end)
+        with self._lock:
+            self._bump(user)
+            keys = self._by_user.get(user)
+            if not keys:
+                return
+            stale = [key for key in keys if key[1] < end and key[2] > start]
+            for key in stale:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._size = 0
+            self._generations.clear()
+            self._epoch += 1
+
+    def _bump(self, user):
+        #caller must hold the lock, the table is reset rather than growing with every user ever written
+        if user not in self._generations and len(self._generations) >= self.max_entries * 4:
+            self._generations.clear()
+            self._epoch += 1
+        self._generations[user] = self._generations.get(user, 0) + 1
+
+    def _remove(self, key):
+        #caller must hold the lock
+        body, _ = self._entries.pop(key)
+        self._size -= len(body)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+
+event_cache = EventWindowCache(
+    max_bytes=int(os.environ.get("EVENT_CACHE_MAX_BYTES", 8 * 1024 * 1024)),
+    max_entries=int(os.environ.get("EVENT_CACHE_MAX_ENTRIES", 2048)),
+    ttl=float(os.environ.get("EVENT_CACHE_TTL", 30))
+)
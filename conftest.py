@@ -0,0 +1 @@
+#keeps the repository root importable for tests, the modules under test do not need a MongoDB connection
@@ -1,5 +1,5 @@
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, TEXT
 
 _client: MongoClient | None = None
 
@@ -9,8 +9,28 @@ def get_client() -> MongoClient:
         uri = os.environ["MONGODB_URI"]
         _client = MongoClient(uri)
         _client.admin.command("ping") #fail fast if misconfigured
+        ensure_indexes(_client["ExtraPerformanceDB"])
     return _client
 
 
+def ensure_indexes(db):
+    #create_index is a no-op when the index already exists
+    db.Events.create_index([("userId", ASCENDING), ("start", ASCENDING)])
+    #imported events are deduplicated per user on the UID and RECURRENCE-ID of the source calendar
+    db.Events.create_index(
+        [("userId", ASCENDING), ("sourceUid", ASCENDING), ("sourceRecurrenceId", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"sourceUid": {"$type": "string"}}
+    )
+    #search index, prefixed by userId so text queries only scan one user's events
+    db.Events.create_index(
+        [("userId", ASCENDING), ("title", TEXT), ("description", TEXT), ("location", TEXT)],
+        name="userId_search_text",
+        weights={"title": 10, "location": 5, "description": 1}
+    )
+    #revoked token digests expire at the token's own exp
+    db.blacklist.create_index("expiresAt", expireAfterSeconds=0)
+
+
 def get_db():
     return get_client()["ExtraPerformanceDB"]
\ No newline at end of file
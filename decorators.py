@@ -1,12 +1,15 @@
 import jwt
 import json
 import os
+import inspect
 from functools import wraps
 import azure.functions as func
+from azurefunctions.extensions.http.fastapi import JSONResponse, StreamingResponse
+from admission import AdmittedStreamingResponse, limiters
 from db.mongo import get_db
+from revocation import isRevoked
 
 db = get_db()
-blacklist = db.blacklist
 
 def cors_headers():
     return {
@@ -15,6 +18,34 @@ def cors_headers():
         "Access-Control-Allow-Headers": "Content-Type,Authorization"
     }
 
+def check_token(auth_header):
+    #validates a bearer token, returning (token, claims, error, status_code)
+    #shared by jwt_required and endpoints that do not use func.HttpRequest
+    token = None
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ", 1)[1].strip()
+
+    if not token:
+        return None, None, 'Token is missing', 401
+
+    # validate token
+    secret_key = os.environ.get("JWT_SECRET_KEY")
+    if not secret_key:
+        return None, None, 'Server configuration error', 500
+
+    try:
+        claims = jwt.decode(token, secret_key, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return None, None, 'Token has expired', 401
+    except jwt.InvalidTokenError:
+        return None, None, 'Token is invalid', 401
+
+    # check if token is blacklisted or issued before the user logged out everywhere
+    if isRevoked(db, claims, token):
+        return None, None, 'Token has been cancelled', 401
+
+    return token, claims, None, 200
+
 def jwt_required(route_function):
     #decorator to check if JWT is valid and not blacklisted
     @wraps(route_function)
@@ -23,53 +54,75 @@ def jwt_required(route_function):
         if req.method == "OPTIONS":
             return func.HttpResponse(status_code=204)
 
-        #extract token from authorization header
-        auth_header = req.headers.get('Authorization')
-        token = None
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ", 1)[1].strip()
-
-        if not token:
+        #extract token from authorization header and validate
+        token, claims, error, status_code = check_token(req.headers.get('Authorization'))
+        if error:
             return func.HttpResponse(
-                json.dumps({'error': 'Token is missing'}),
+                json.dumps({'error': error}),
                 mimetype="application/json",
-                status_code=401
-            )
-
-        # validate token
-        secret_key = os.environ.get("JWT_SECRET_KEY")
-        if not secret_key:
-            return func.HttpResponse(
-                json.dumps({'error': 'Server configuration error'}),
-                mimetype="application/json",
-                status_code=500
-            )
-
-        try:
-            jwt.decode(token, secret_key, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return func.HttpResponse(
-                json.dumps({'error': 'Token has expired'}),
-                mimetype="application/json",
-                status_code=401
-            )
-        except jwt.InvalidTokenError:
-            return func.HttpResponse(
-                json.dumps({'error': 'Token is invalid'}),
-                mimetype="application/json",
-                status_code=401
-            )
-
-        # check if token is blacklisted
-        bl_token = blacklist.find_one({'token': token})
-        if bl_token is not None:
-            return func.HttpResponse(
-                json.dumps({'error': 'Token has been cancelled'}),
-                mimetype="application/json",
-                status_code=401
+                status_code=status_code
             )
 
         # token is valid, call the original function with token
         setattr(req, "jwt_token", token)
+        setattr(req, "jwt_claims", claims)
         return route_function(req, *args, **kwargs)
-    return jwt_required_wrapper
\ No newline at end of file
+    return jwt_required_wrapper
+
+#status code returned for each reason a request can be shed
+shedStatus = {"at_capacity": 503, "queue_full": 429, "timeout": 503}
+
+def admission_control(endpoint_class):
+    #decorator to limit concurrent requests per endpoint class, shedding with 429/503 when the budget is exhausted
+    limiter = limiters[endpoint_class]
+
+    def shed_body(reason):
+        return {'error': 'Server busy, please retry', 'reason': reason}
+
+    def decorator(route_function):
+        if inspect.iscoroutinefunction(route_function):
+            @wraps(route_function)
+            async def admission_async_wrapper(req, *args, **kwargs):
+                if req.method == "OPTIONS":
+                    return await route_function(req, *args, **kwargs)
+
+                #waiting for a slot awaits a future, no thread is held
+                reason = await limiter.acquire_async()
+                if reason:
+                    return JSONResponse(
+                        shed_body(reason),
+                        status_code=shedStatus[reason],
+                        headers={"Retry-After": str(limiter.retry_after)}
+                    )
+                try:
+                    response = await route_function(req, *args, **kwargs)
+                except BaseException:
+                    limiter.release()
+                    raise
+                if isinstance(response, StreamingResponse):
+                    return AdmittedStreamingResponse(response, limiter)
+                limiter.release()
+                return response
+            return admission_async_wrapper
+
+        @wraps(route_function)
+        def admission_wrapper(req: func.HttpRequest, *args, **kwargs) -> func.HttpResponse:
+            #CORS preflight does not use any budget
+            if req.method == "OPTIONS":
+                return route_function(req, *args, **kwargs)
+
+            #sync handlers are never queued, waiting would hold a thread other endpoints need
+            reason = limiter.try_acquire()
+            if reason:
+                return func.HttpResponse(
+                    json.dumps(shed_body(reason)),
+                    mimetype="application/json",
+                    status_code=shedStatus[reason],
+                    headers={"Retry-After": str(limiter.retry_after)}
+                )
+            try:
+                return route_function(req, *args, **kwargs)
+            finally:
+                limiter.release()
+        return admission_wrapper
+    return decorator
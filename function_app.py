@@ -4,9 +4,13 @@ import json
 import logging
 from routes.events import bp as events_bp
 from routes.users import bp as users_bp
+from routes.calendar import bp as calendar_bp
+from routes.metrics import bp as metrics_bp
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
 
 app.register_blueprint(events_bp)
 app.register_blueprint(users_bp)
+app.register_blueprint(calendar_bp)
+app.register_blueprint(metrics_bp)
 
@@ -0,0 +1,337 @@
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from dateutil.rrule import rrulestr, rruleset
+
+PRODID = "-//Extra Performance//Calendar Export//EN"
+UID_DOMAIN = "extra-performance"
+
+#helper to escape TEXT values as per RFC 5545
+def escapeText(value):
+    return (value.replace("\\", "\\\\")
+                 .replace(";", "\\;")
+                 .replace(",", "\\,")
+                 .replace("\r\n", "\\n")
+                 .replace("\n", "\\n"))
+
+#helper to format a datetime as a UTC DATE-TIME value
+def formatDatetime(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+#helper to fold content lines longer than 75 octets
+def foldLine(line):
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return encoded + b"\r\n"
+
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        #never split a multi-byte utf-8 character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut])
+        encoded = encoded[cut:]
+        #continuation lines start with a space, which counts towards the limit
+        limit = 74
+    return b"\r\n ".join(parts) + b"\r\n"
+
+def calendarHeader():
+    return (foldLine("BEGIN:VCALENDAR")
+            + foldLine("VERSION:2.0")
+            + foldLine("PRODID:" + PRODID)
+            + foldLine("CALSCALE:GREGORIAN"))
+
+def calendarFooter():
+    return foldLine("END:VCALENDAR")
+
+#converts an event document from MongoDB into a VEVENT block
+def formatEvent(event, stamp):
+    lines = [
+        "BEGIN:VEVENT",
+        "UID:%s@%s" % (event["_id"], UID_DOMAIN),
+        "DTSTAMP:" + stamp,
+        "DTSTART:" + formatDatetime(event["start"]),
+        "DTEND:" + formatDatetime(event["end"]),
+        "SUMMARY:" + escapeText(event["title"]),
+        "CATEGORIES:" + event["eventType"],
+    ]
+    if event.get("description"):
+        lines.append("DESCRIPTION:" + escapeText(event["description"]))
+    if event.get("location"):
+        lines.append("LOCATION:" + escapeText(event["location"]))
+    lines.append("END:VEVENT")
+    return b"".join(foldLine(line) for line in lines)
+
+
+#properties kept from each VEVENT, anything else is ignored
+importedProperties = {
+    "UID", "SUMMARY", "DESCRIPTION", "LOCATION", "DTSTART", "DTEND", "DURATION", "CATEGORIES", "STATUS",
+    "RRULE", "RECURRENCE-ID"
+}
+#properties that may appear more than once, kept as lists
+repeatedProperties = {"RDATE", "EXDATE"}
+#longest content line accepted after unfolding, real calendars stay far below this
+MAX_LINE_BYTES = 64 * 1024
+
+durationPattern = re.compile(
+    r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$"
+)
+
+#helper to reverse escapeText
+def unescapeText(value):
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            out.append("\n" if char in ("n", "N") else char)
+        else:
+            out.append(char)
+    return "".join(out)
+
+#splits a content line into (name, params, value)
+def parseContentLine(line):
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None
+
+    name, *rawParams = head.split(";")
+    params = {}
+    for param in rawParams:
+        key, _, paramValue = param.partition("=")
+        params[key.upper()] = paramValue.strip('"')
+    return name.upper(), params, value
+
+#parses date and date-time values, returning (aware datetime, is_date) or (None, False)
+#local times use their TZID, floating times and dates are taken as UTC
+def parseLocalDatetime(value, params):
+    try:
+        if params.get("VALUE") == "DATE" or len(value) == 8:
+            return datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc), True
+        if value.endswith("Z"):
+            return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc), False
+        parsed = datetime.strptime(value, "%Y%m%dT%H%M%S")
+    except ValueError:
+        return None, False
+
+    tzid = params.get("TZID")
+    try:
+        zone = ZoneInfo(tzid) if tzid else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        zone = timezone.utc
+    return parsed.replace(tzinfo=zone), False
+
+#parses DTSTART/DTEND values, returning (naive UTC datetime, is_date) or (None, False)
+def parseDatetime(value, params):
+    parsed, isDate = parseLocalDatetime(value, params)
+    if parsed is None:
+        return None, False
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None), isDate
+
+def parseDuration(value):
+    match = durationPattern.match(value)
+    if not match or not any(match.groups()[1:]):
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0),
+        hours=int(hours or 0), minutes=int(minutes or 0), seconds=int(seconds or 0)
+    )
+    return -duration if sign == "-" else duration
+
+
+class EventParser:
+    #incremental VEVENT parser, bytes are fed in as they arrive and complete events are returned
+    #each event is a dict of property name -> (params, value) for importedProperties
+    #and property name -> [(params, value), ...] for repeatedProperties
+    #content lines longer than max_line bytes, folded or not, raise ValueError
+
+    def __init__(self, max_line=MAX_LINE_BYTES):
+        self.max_line = max_line
+        self._partial = bytearray()
+        self._pending = None
+        self._event = None
+        self._nested = 0
+
+    def feed(self, chunk):
+        #only the new chunk is searched for line breaks, the unfinished line is kept in a bytearray
+        events = []
+        start = 0
+        newline = chunk.find(b"\n")
+        while newline != -1:
+            if self._partial:
+                self._extend(self._partial, chunk[start:newline])
+                line = bytes(self._partial)
+                self._partial.clear()
+            else:
+                line = chunk[start:newline]
+                self._checkLength(len(line))
+            self._unfold(line.rstrip(b"\r"), events)
+            start = newline + 1
+            newline = chunk.find(b"\n", start)
+        self._extend(self._partial, chunk[start:])
+        return events
+
+    def close(self):
+        events = []
+        if self._partial:
+            self._unfold(bytes(self._partial).rstrip(b"\r"), events)
+            self._partial.clear()
+        if self._pending is not None:
+            self._process(self._pending, events)
+            self._pending = None
+        return events
+
+    def _checkLength(self, length):
+        if length > self.max_line:
+            raise ValueError("Content line longer than %d bytes" % self.max_line)
+
+    def _extend(self, buffer, data):
+        self._checkLength(len(buffer) + len(data))
+        buffer += data
+
+    def _unfold(self, line, events):
+        #folded lines continue the previous line after a single space or tab
+        if line[:1] in (b" ", b"\t") and self._pending is not None:
+            self._extend(self._pending, line[1:])
+            return
+        if self._pending is not None:
+            self._process(self._pending, events)
+        self._pending = bytearray(line)
+
+    def _process(self, raw, events):
+        parsed = parseContentLine(raw.decode("utf-8", errors="replace"))
+        if parsed is None:
+            return
+        name, params, value = parsed
+
+        if name == "BEGIN":
+            if value.upper() == "VEVENT":
+                self._event = {}
+                self._nested = 0
+            elif self._event is not None:
+                self._nested += 1
+        elif name == "END":
+            if self._event is None:
+                return
+            if self._nested:
+                self._nested -= 1
+            elif value.upper() == "VEVENT":
+                events.append(self._event)
+                self._event = None
+        elif self._event is not None and not self._nested:
+            #properties of nested components such as VALARM are skipped
+            if name in importedProperties and name not in self._event:
+                self._event[name] = (params, value)
+            elif name in repeatedProperties:
+                self._event.setdefault(name, []).append((params, value))
+
+#maps a parsed VEVENT onto plain event fields, values that cannot be parsed are None
+def eventFields(vevent):
+    def text(name):
+        prop = vevent.get(name)
+        return unescapeText(prop[1]) if prop else None
+
+    start, end = None, None
+    startIsDate = False
+    if "DTSTART" in vevent:
+        start, startIsDate = parseDatetime(vevent["DTSTART"][1].strip(), vevent["DTSTART"][0])
+    if "DTEND" in vevent:
+        end, _ = parseDatetime(vevent["DTEND"][1].strip(), vevent["DTEND"][0])
+    elif start is not None and "DURATION" in vevent:
+        duration = parseDuration(vevent["DURATION"][1].strip())
+        end = start + duration if duration is not None else None
+    elif start is not None and startIsDate:
+        #all-day events without an end last one day
+        end = start + timedelta(days=1)
+
+    categories = text("CATEGORIES")
+    return {
+        "uid": text("UID"),
+        "title": text("SUMMARY"),
+        "description": text("DESCRIPTION"),
+        "location": text("LOCATION"),
+        "start": start,
+        "end": end,
+        "categories": [c.strip().upper() for c in categories.split(",")] if categories else []
+    }
+
+#helper to get every date listed by RDATE/EXDATE properties as aware datetimes
+def listedDates(vevent, name):
+    dates = []
+    for params, value in vevent.get(name, []):
+        for item in value.split(","):
+            parsed, _ = parseLocalDatetime(item.strip(), params)
+            if parsed is not None:
+                dates.append(parsed)
+    return dates
+
+#expands a VEVENT into its occurrences, each being eventFields plus a recurrenceId
+#recurrenceId is None for single events, otherwise the UTC original start that identifies the instance
+#returns (occurrences, truncated), raising ValueError for recurrence rules that cannot be expanded
+def expandEvent(vevent, horizon, limit):
+    fields = eventFields(vevent)
+    fields["cancelled"] = vevent.get("STATUS", ({}, ""))[1].strip().upper() == "CANCELLED"
+    fields["recurrenceId"] = None
+
+    #overridden instances of a series are identified by the occurrence they replace
+    if "RECURRENCE-ID" in vevent:
+        params, value = vevent["RECURRENCE-ID"]
+        original, _ = parseDatetime(value.strip(), params)
+        if original is None:
+            raise ValueError("Invalid RECURRENCE-ID")
+        fields["recurrenceId"] = formatDatetime(original)
+        return [fields], False
+
+    if "RRULE" not in vevent and "RDATE" not in vevent:
+        return [fields], False
+    if fields["start"] is None or fields["end"] is None:
+        #left to validation to report
+        return [fields], False
+
+    params, value = vevent["DTSTART"]
+    value = value.strip()
+    localStart, isDate = parseLocalDatetime(value, params)
+    duration = fields["end"] - fields["start"]
+
+    #dates and floating times are expanded as naive UTC, as their UNTIL is floating too
+    floating = isDate or (not value.endswith("Z") and "TZID" not in params)
+    def seriesDate(date):
+        return date.astimezone(timezone.utc).replace(tzinfo=None) if floating else date
+
+    try:
+        series = rruleset()
+        if "RRULE" in vevent:
+            series.rrule(rrulestr(vevent["RRULE"][1].strip(), dtstart=seriesDate(localStart)))
+        else:
+            series.rdate(seriesDate(localStart))
+        for date in listedDates(vevent, "RDATE"):
+            series.rdate(seriesDate(date))
+        for date in listedDates(vevent, "EXDATE"):
+            series.exdate(seriesDate(date))
+
+        occurrences = []
+        truncated = False
+        for occurrence in series:
+            start = occurrence if floating else occurrence.astimezone(timezone.utc).replace(tzinfo=None)
+            if start > horizon or len(occurrences) >= limit:
+                truncated = True
+                break
+            instance = dict(fields)
+            instance["start"] = start
+            instance["end"] = start + duration
+            instance["recurrenceId"] = formatDatetime(start)
+            occurrences.append(instance)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Unsupported recurrence: %s" % e)
+    return occurrences, truncated
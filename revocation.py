@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+
+#revoked tokens are stored in the blacklist as {_id: sha256 digest, expiresAt: token exp}
+#a TTL index on expiresAt removes each entry once the token could no longer be used anyway
+#"log out everywhere" sets users.tokensValidAfter, tokens issued before it are rejected
+#tokensValidAfter is cached per worker for a few seconds so the usual check is a single blacklist lookup
+
+#claims added to every issued token so it can be revoked without storing the raw JWT
+def newTokenClaims():
+    return {"jti": uuid.uuid4().hex, "iat": time.time()}
+
+#helper to get the fixed-size blacklist key for a token
+def tokenDigest(claims, token):
+    #tokens issued before jti was introduced are keyed on the raw token instead
+    source = claims.get("jti") or token
+    return hashlib.sha256(source.encode("utf-8")).digest()
+
+def revokeToken(db, claims, token):
+    expires_at = None
+    if "exp" in claims:
+        expires_at = datetime.fromtimestamp(claims["exp"], tz=timezone.utc)
+    db.blacklist.update_one(
+        {"_id": tokenDigest(claims, token)},
+        {"$setOnInsert": {"expiresAt": expires_at}},
+        upsert=True
+    )
+
+def revokeAllTokens(db, user_id):
+    valid_after = time.time()
+    result = db.users.update_one(
+        {"_id": user_id},
+        {"$set": {"tokensValidAfter": valid_after}}
+    )
+    #takes effect on this worker straight away, other workers pick it up within REVOCATION_EPOCH_TTL
+    epoch_cache.store(str(user_id), valid_after)
+    return result.matched_count == 1
+
+def userEpoch(db, user_id):
+    #returns users.tokensValidAfter, or None if the user never logged out everywhere
+    key = str(user_id)
+    found, valid_after = epoch_cache.lookup(key)
+    if found:
+        return valid_after
+    user = db.users.find_one({"_id": user_id}, {"tokensValidAfter": 1})
+    valid_after = user.get("tokensValidAfter") if user else None
+    epoch_cache.store(key, valid_after)
+    return valid_after
+
+def isRevoked(db, claims, token):
+    #the epoch is usually cached, so most requests only make the blacklist lookup
+    try:
+        user_id = ObjectId(claims.get("userId"))
+    except (InvalidId, TypeError):
+        user_id = None
+    if user_id is not None:
+        valid_after = userEpoch(db, user_id)
+        if valid_after is not None and claims.get("iat", 0) < valid_after:
+            return True
+
+    return db.blacklist.find_one({"_id": tokenDigest(claims, token)}, {"_id": 1}) is not None
+
+def migrateLegacyBlacklist(db, max_token_lifetime=3600):
+    #converts {token: ...} entries from before digests were stored, which have no expiresAt for the TTL index
+    #they are given the longest lifetime a token can have, then removed
+    #one-off, run with scripts/migrate_legacy_blacklist.py rather than on every cold start
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=max_token_lifetime)
+    for legacy in db.blacklist.find({"token": {"$exists": True}}):
+        db.blacklist.update_one(
+            {"_id": tokenDigest({}, legacy["token"])},
+            {"$setOnInsert": {"expiresAt": expires_at}},
+            upsert=True
+        )
+    db.blacklist.delete_many({"token": {"$exists": True}})
+
+
+class EpochCache:
+    #short-lived per-worker cache of users.tokensValidAfter, bounded by resetting when full
+
+    def __init__(self, ttl=5.0, max_entries=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        #returns (found, valid_after)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                return False, None
+            return True, entry[0]
+
+    def store(self, key, valid_after):
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is None and len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            #tokensValidAfter only moves forward, so a read that raced a logout-all cannot undo it
+            if existing is not None and existing[0] is not None and (valid_after is None or existing[0] > valid_after):
+                valid_after = existing[0]
+            self._entries[key] = (valid_after, self._clock() + self.ttl)
+
+
+epoch_cache = EpochCache(ttl=float(os.environ.get("REVOCATION_EPOCH_TTL", 5)))
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import azure.functions as func
+from azurefunctions.extensions.http.fastapi import Request, Response, JSONResponse, StreamingResponse
+from db.mongo import get_db
+import json
+import zlib
+from decorators import admission_control, check_token
+from routes.events import checkString, serializeEvent
+from validation import eventTypes, validateCreateEvent
+from cache import event_cache
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DeleteOne, InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta, timezone
+import ical
+
+bp = func.Blueprint()
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+IMPORT_MAX_ERRORS = 50
+IMPORT_RECURRENCE_LIMIT = 500
+IMPORT_MAX_OCCURRENCES = 10000
+IMPORT_RECURRENCE_HORIZON_DAYS = 730
+
+exportFormats = {
+    "ndjson": ("application/x-ndjson", "events.ndjson"),
+    "ics": ("text/calendar; charset=utf-8", "events.ics")
+}
+
+#helper to resolve the userId for endpoints using the streaming request type
+async def authenticate(req: Request):
+    #check_token queries MongoDB, so it runs off the event loop
+    token, claims, error, status_code = await asyncio.to_thread(check_token, req.headers.get("Authorization"))
+    if error:
+        return None, JSONResponse({"error": error}, status_code=status_code)
+
+    try:
+        return ObjectId(claims.get("userId")), None
+    except (InvalidId, TypeError):
+        return None, JSONResponse({"error": "Invalid userId in token"}, status_code=401)
+
+#generator over all of a user's events, fetched from MongoDB in batches
+def iterUserEvents(db, user_id):
+    cursor = db.Events.find({"userId": user_id}).sort("start", 1).batch_size(EXPORT_BATCH_SIZE)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+def ndjsonChunks(events):
+    for event in events:
+        yield json.dumps(serializeEvent(event)).encode("utf-8") + b"\n"
+
+def icsChunks(events):
+    stamp = ical.formatDatetime(datetime.now(timezone.utc))
+    yield ical.calendarHeader()
+    for event in events:
+        yield ical.formatEvent(event, stamp)
+    yield ical.calendarFooter()
+
+#coalesces small chunks so each write to the response is a reasonable size
+def bufferChunks(chunks, size=EXPORT_CHUNK_SIZE):
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+def gzipChunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+#maps one occurrence of a parsed VEVENT onto a new event document, returning (event, invalid_fields)
+def importedEvent(fields, user_id):
+    #categories matching an event type are used, anything else is a standard event
+    payload = {
+        "eventType": next((c for c in fields["categories"] if c in eventTypes), "STANDARD"),
+        "title": fields["title"],
+        "start": fields["start"],
+        "end": fields["end"],
+        "description": fields["description"],
+        "location": fields["location"]
+    }
+    event, missing, invalid = validateCreateEvent(payload)
+    if invalid:
+        return None, list(invalid)
+
+    new_event = {
+        'userId': user_id,
+        'eventType': event['eventType'],
+        'title': event['title'],
+        'description': event.get('description'),
+        'start': event['start'],
+        'end': event['end'],
+        'location': event.get('location'),
+        'workoutLogId': None
+    }
+    if checkString(fields["uid"]):
+        new_event['sourceUid'] = fields["uid"].strip()
+        if fields["recurrenceId"]:
+            new_event['sourceRecurrenceId'] = fields["recurrenceId"]
+    return new_event, None
+
+#builds the write for one occurrence, or None when there is nothing to write
+#overridden instances replace the occurrence generated from their series, whichever arrives first
+#cancelled instances are recorded in cancelled for the whole import, so their occurrence is skipped when
+#the series arrives later and deleted when it was imported before
+def importOperation(new_event, fields, cancelled):
+    if fields["recurrenceId"] is None or 'sourceUid' not in new_event:
+        return None if fields["cancelled"] else InsertOne(new_event)
+    key = {
+        'userId': new_event['userId'],
+        'sourceUid': new_event['sourceUid'],
+        'sourceRecurrenceId': new_event['sourceRecurrenceId']
+    }
+    if fields["cancelled"]:
+        cancelled.add((new_event['sourceUid'], new_event['sourceRecurrenceId']))
+        return DeleteOne(key)
+    if (new_event['sourceUid'], new_event['sourceRecurrenceId']) in cancelled:
+        return None
+    if fields["isOverride"]:
+        return ReplaceOne(key, new_event, upsert=True)
+    return InsertOne(new_event)
+
+#applies a chunk of writes unordered, returning counts for the import summary
+def flushOperations(events, operations):
+    try:
+        result = events.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+        writeErrors = []
+    except BulkWriteError as e:
+        details = e.details
+        writeErrors = details["writeErrors"]
+    duplicates = sum(1 for error in writeErrors if error["code"] == 11000)
+    return {
+        "imported": details["nInserted"] + details["nUpserted"],
+        "updated": details["nModified"],
+        "cancelled": details["nRemoved"],
+        "duplicates": duplicates,
+        "failed": len(writeErrors) - duplicates
+    }
+
+
+@bp.route(route="v1.0/exportEvents", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("bulk")
+async def export_events(req: Request):
+    logging.info("exportEvents called")
+
+    #allow CORS preflight
+    if req.method == "OPTIONS":
+        return Response(status_code=204)
+
+    user_id, error = await authenticate(req)
+    if error:
+        return error
+
+    #checking requested format is supported
+    exportFormat = req.query_params.get("format", "ndjson")
+    if exportFormat not in exportFormats:
+        return JSONResponse(
+            {"error": "Invalid format", "allowed": list(exportFormats)},
+            status_code=400
+        )
+    mediaType, filename = exportFormats[exportFormat]
+
+    #building the generator pipeline, nothing is read from MongoDB until the response is streamed
+    db = get_db()
+    events = iterUserEvents(db, user_id)
+    if exportFormat == "ics":
+        chunks = bufferChunks(icsChunks(events))
+    else:
+        chunks = bufferChunks(ndjsonChunks(events))
+
+    headers = {
+        "Content-Disposition": 'attachment; filename="%s"' % filename,
+        "Vary": "Accept-Encoding"
+    }
+    if "gzip" in req.headers.get("Accept-Encoding", ""):
+        chunks = gzipChunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(chunks, media_type=mediaType, headers=headers)
+
+
+@bp.route(route="v1.0/importEvents", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("bulk")
+async def import_events(req: Request):
+    logging.info("importEvents called")
+
+    #allow CORS preflight
+    if req.method == "OPTIONS":
+        return Response(status_code=204)
+
+    user_id, error = await authenticate(req)
+    if error:
+        return error
+
+    db = get_db()
+    events = db.Events
+
+    #checking userId exists
+    existing = await asyncio.to_thread(db.users.find_one, {"_id": user_id}, {"_id": 1})
+    if not existing:
+        return JSONResponse({"error": "userId does not exist"}, status_code=403)
+
+    parser = ical.EventParser()
+    summary = {
+        "imported": 0, "updated": 0, "cancelled": 0, "duplicates": 0, "invalid": 0, "failed": 0,
+        "unsupported": 0, "truncatedSeries": 0, "errors": []
+    }
+    batch = []
+    batchKeys = set()
+    cancelled = set()
+    received = 0
+    expanded = 0
+    index = 0
+    horizon = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=IMPORT_RECURRENCE_HORIZON_DAYS)
+
+    #runs on a worker thread, like everything collect does
+    def flush():
+        counts = flushOperations(events, batch)
+        for name, count in counts.items():
+            summary[name] += count
+        batch.clear()
+        batchKeys.clear()
+
+    def reportError(vevent, **error):
+        if len(summary["errors"]) < IMPORT_MAX_ERRORS:
+            uid = vevent.get("UID")
+            summary["errors"].append({"event": index, "uid": uid[1] if uid else None, **error})
+
+    #returns False once the upload has expanded to IMPORT_MAX_OCCURRENCES
+    def collect(vevents):
+        nonlocal index, expanded
+        for vevent in vevents:
+            index += 1
+            remaining = IMPORT_MAX_OCCURRENCES - expanded
+            if remaining <= 0:
+                return False
+            limit = min(IMPORT_RECURRENCE_LIMIT, remaining)
+            try:
+                occurrences, truncated = ical.expandEvent(vevent, horizon, limit)
+            except ValueError as e:
+                summary["unsupported"] += 1
+                reportError(vevent, unsupported=str(e))
+                continue
+            expanded += len(occurrences)
+            #a series cut short by the upload-wide limit ends the import instead of counting as truncated
+            capped = truncated and limit < IMPORT_RECURRENCE_LIMIT and len(occurrences) == limit
+            if truncated and not capped:
+                summary["truncatedSeries"] += 1
+
+            isOverride = "RECURRENCE-ID" in vevent
+            for fields in occurrences:
+                fields["isOverride"] = isOverride
+                new_event, invalid_fields = importedEvent(fields, user_id)
+                if invalid_fields:
+                    summary["invalid"] += 1
+                    reportError(vevent, invalid=invalid_fields)
+                    continue
+                operation = importOperation(new_event, fields, cancelled)
+                if operation is None:
+                    #cancelled events and series are not imported
+                    summary["cancelled"] += 1
+                    continue
+                key = (new_event.get('sourceUid'), new_event.get('sourceRecurrenceId'))
+                if isinstance(operation, DeleteOne) and key in batchKeys:
+                    #unordered writes could run the delete before the insert it cancels
+                    flush()
+                batch.append(operation)
+                batchKeys.add(key)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+            if capped:
+                return False
+        return True
+
+    #parsing and expanding is CPU bound and flushing blocks, so each chunk is handled off the event loop
+    #parser errors and the limits stop reading the upload
+    def consume(chunk):
+        return collect(parser.feed(chunk))
+
+    def finish():
+        return collect(parser.close())
+
+    tooMany = ({"error": "Too many events", "maxEvents": IMPORT_MAX_OCCURRENCES}, 413)
+    failure = None
+    try:
+        async for chunk in req.stream():
+            received += len(chunk)
+            if received > IMPORT_MAX_BYTES:
+                failure = ({"error": "Upload too large", "maxBytes": IMPORT_MAX_BYTES}, 413)
+                break
+            if not await asyncio.to_thread(consume, chunk):
+                failure = tooMany
+                break
+        else:
+            if not await asyncio.to_thread(finish):
+                failure = tooMany
+    except ValueError as e:
+        failure = ({"error": "Invalid calendar", "detail": str(e)}, 400)
+
+    #events validated before an upload was rejected are kept, like those already flushed
+    if batch:
+        await asyncio.to_thread(flush)
+
+    #events flushed before an upload was rejected are kept, so invalidate either way
+    #cancelled instances may be anywhere in the user's history, so every cached window is dropped
+    if summary["imported"] or summary["updated"] or summary["cancelled"]:
+        event_cache.invalidate(user_id, datetime.min, datetime.max)
+
+    if failure is not None:
+        body, status_code = failure
+        return JSONResponse({**body, "summary": summary}, status_code=status_code)
+
+    return JSONResponse(summary, status_code=200)
@@ -2,7 +2,10 @@ import os, logging
 import azure.functions as func
 from db.mongo import get_db
 import json
-from decorators import jwt_required
+from decorators import admission_control, jwt_required
+from cache import event_cache
+from search import decodeCursor, nextCursor, searchOrders, searchPipeline
+from validation import afterMessage, createErrorBody, editErrorBody, validateCreateEvent, validateEditEvent
 from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime
@@ -10,7 +13,9 @@ import jwt
 
 bp = func.Blueprint()
 
-eventTypes = ["STANDARD", "WORKOUT"]
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_QUERY_LENGTH = 200
 
 #helper method to check string inputs
 def checkString(value):
@@ -40,6 +45,24 @@ def decodeToken(token):
     )
     return decoded.get("userId")
 
+#helper to build the 400 response for payloads failing validation
+def validationError(body):
+    return func.HttpResponse(
+        json.dumps(body),
+        mimetype="application/json",
+        status_code=400
+    )
+
+#helper to convert non-string values of an event document to strings for output
+def serializeEvent(event):
+    event['_id'] = str(event['_id'])
+    event['userId'] = str(event['userId'])
+    if event['workoutLogId']:
+        event['workoutLogId'] = str(event['workoutLogId'])
+    event['start'] = str(event['start'])
+    event['end'] = str(event['end'])
+    return event
+
 @bp.route(route="events", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
 #endpoint to test initial setup of MongoDB and deploy to azure. NOT USED IN PROD
 def get_events(req: func.HttpRequest) -> func.HttpResponse:
@@ -54,6 +77,7 @@ def get_events(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @bp.route(route="v1.0/userEvents", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("reads")
 @jwt_required
 def get_user_events(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("userEvents called")
@@ -115,6 +139,18 @@ def get_user_events(req: func.HttpRequest) -> func.HttpResponse:
             status_code=400
         )
 
+    #serving repeated reads of the same window from the per-worker cache
+    cached = event_cache.get(user_id, from_dt, to_dt)
+    if cached is not None:
+        return func.HttpResponse(
+            body=cached,
+            mimetype="application/json",
+            status_code=200
+        )
+
+    #capturing the generation first so a write racing this read keeps the result out of the cache
+    generation = event_cache.generation(user_id)
+
     #querying db for user events
     events = list(db.Events.find({
         'userId': user_id,
@@ -124,16 +160,14 @@ def get_user_events(req: func.HttpRequest) -> func.HttpResponse:
 
     #converting non-string values to string for output
     for event in events:
-        event['_id'] = str(event['_id'])
-        event['userId'] = str(event['userId'])
-        if event['workoutLogId']:
-            event['workoutLogId'] = str(event['workoutLogId'])
-        event['start'] = str(event['start'])
-        event['end'] = str(event['end'])
+        serializeEvent(event)
+
+    body = json.dumps(events).encode("utf-8")
+    event_cache.put(user_id, from_dt, to_dt, body, generation)
 
     #returning list of events
     return func.HttpResponse(
-        body=json.dumps(events),
+        body=body,
         mimetype="application/json",
         status_code=200
     )
@@ -141,6 +175,7 @@ def get_user_events(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @bp.route(route="v1.0/createEvent", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("writes")
 @jwt_required
 def create_event(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("createEvent called")
@@ -174,15 +209,10 @@ def create_event(req: func.HttpRequest) -> func.HttpResponse:
             status_code=400
         )
     
-    #checking required fields are present
-    required = {"eventType", "title", "start", "end"}
-    missing = [field for field in required if field not in data]
-    if missing:
-        return func.HttpResponse(
-            json.dumps({"error": "Missing data", "missing": missing}),
-            mimetype="application/json",
-            status_code=400
-        )
+    #validating all fields in a single pass
+    event, missing, invalid = validateCreateEvent(data)
+    if missing or invalid:
+        return validationError(createErrorBody(missing, invalid))
     
     #getting userId from token
     token = getattr(req, "jwt_token", None)
@@ -196,68 +226,8 @@ def create_event(req: func.HttpRequest) -> func.HttpResponse:
             status_code=401
         )
     
-    #validating required fields
-    invalid_fields = []
-    try:
-        event_userId = ObjectId(user_id)
-    except (InvalidId, TypeError, AttributeError):
-        invalid_fields.append("userId")
-    if checkString(data["title"]):
-        event_title = data["title"].strip()
-    else:
-        invalid_fields.append("title")
-    if checkString(data["eventType"]) and data["eventType"].strip() in eventTypes:
-        event_type = data["eventType"].strip()
-    else:
-        invalid_fields.append("eventType")
-    event_start = checkDatetime(data["start"])
-    if not event_start:
-        invalid_fields.append("start")
-    event_end = checkDatetime(data["end"])
-    if not event_end:
-        invalid_fields.append("end")
-    
-    if invalid_fields:
-        return func.HttpResponse(
-            json.dumps({"error": "Invalid data", "invalid": invalid_fields}),
-            mimetype="application/json",
-            status_code=400
-        )
-    
-    if event_end <= event_start:
-        return func.HttpResponse(
-            json.dumps({"error": "event end must be after start"}),
-            mimetype="application/json",
-            status_code=400
-        )
-    
-    #checking optional fields and setting to None if not present
-    event_description = data.get("description")
-    if checkString(event_description):
-        event_description = event_description.strip()
-    else:
-        event_description = None
-    event_location = data.get("location")
-    if checkString(event_location):
-        event_location = event_location.strip()
-    else:
-        event_location = None
-    event_workout_id = data.get("workoutLogId")
-    if checkString(event_workout_id):
-        #checking workoutLogId is valid oid
-        try:
-            event_workout_id = ObjectId(event_workout_id.strip())
-        except (InvalidId, TypeError):
-            return func.HttpResponse(
-                json.dumps({'error': 'workoutLogId is invalid'}),
-                mimetype="application/json",
-                status_code=400
-            )
-    else:
-        event_workout_id = None
-    
     #checking userId exists
-    existing = users.find_one({"_id": event_userId})
+    existing = users.find_one({"_id": user_id})
     if not existing:
         return func.HttpResponse(
             json.dumps({"error": "userId does not exist"}),
@@ -267,18 +237,19 @@ def create_event(req: func.HttpRequest) -> func.HttpResponse:
     
     #creating new event object
     new_event = {
-        'userId': event_userId,
-        'eventType': event_type,
-        'title': event_title,
-        'description': event_description,
-        'start': event_start,
-        'end': event_end,
-        'location': event_location,
-        'workoutLogId': event_workout_id
+        'userId': user_id,
+        'eventType': event['eventType'],
+        'title': event['title'],
+        'description': event.get('description'),
+        'start': event['start'],
+        'end': event['end'],
+        'location': event.get('location'),
+        'workoutLogId': event.get('workoutLogId')
     }
 
     #inserting new event in MongoDB
     result = events.insert_one(new_event)
+    event_cache.invalidate(user_id, new_event['start'], new_event['end'])
 
     #create link for new created event?
     #response with newly created event ID
@@ -290,6 +261,7 @@ def create_event(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @bp.route(route="v1.0/editEvent/{id}", methods=["PATCH", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("writes")
 @jwt_required
 def edit_event(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("editEvent called")
@@ -352,55 +324,12 @@ def edit_event(req: func.HttpRequest) -> func.HttpResponse:
             status_code=401
         )
 
-    allowedFields = {'eventType', 'title', 'description', 'start', 'end', 'location', 'workoutLogId'}
-
-    #checking for invalid fields in JSON
-    invalidFields = [field for field in data if field not in allowedFields]
-    if invalidFields:
-        return func.HttpResponse(
-            json.dumps({"error": "Invalid fields submitted", "invalid": invalidFields}),
-            mimetype="application/json",
-            status_code=400
-        )
-    
-    #categorising fields so appropriate validation can be applied
-    requiredStringFields = {'eventType', 'title'}
-    dateFields = {'start', 'end'}
-    optionalFields = {'description', 'location'}
-
-    edited_event = {}
-    errors = {}
-
-    for field, value in data.items():
-        if field in requiredStringFields:
-            if checkString(value):
-                edited_event[field] = value.strip()
-            else:
-                errors[field] = "Invalid string"
-        elif field in dateFields:
-            edited_event[field] = checkDatetime(value)
-            if not edited_event[field]:
-                errors[field] = "Invalid date"
-        elif field in optionalFields:
-            if checkString(value):
-                edited_event[field] = value.strip()
-            elif value is None:
-                edited_event[field] = None
-            else:
-                errors[field] = "Invalid string"
-        elif field == 'workoutLogId':
-            if value is None:
-                edited_event['workoutLogId'] = None
-            else:
-                errors['workoutLogId'] = "workoutLogId cannot be edited, can only be set to null"
+    #validating submitted fields in a single pass, unknown fields are rejected
+    edited_event, _, errors = validateEditEvent(data)
 
     #returning 400 with errors if any are present
     if errors:
-        return func.HttpResponse(
-            json.dumps({"error": "Invalid fields submitted", "invalid": errors}),
-            mimetype="application/json",
-            status_code=400
-        )
+        return validationError(editErrorBody(errors))
     
     if not edited_event:
         return func.HttpResponse(
@@ -409,12 +338,28 @@ def edit_event(req: func.HttpRequest) -> func.HttpResponse:
             status_code=400
         )
     
+    #fetching the current window so the new one can be checked and cached reads invalidated
+    previous = events.find_one(
+        {"_id": eventId, "userId": user_id},
+        {"start": 1, "end": 1}
+    )
+
+    if previous is not None:
+        new_start = edited_event.get("start", previous["start"])
+        new_end = edited_event.get("end", previous["end"])
+        if new_end <= new_start:
+            return validationError(editErrorBody({"end": afterMessage("end", "start")}))
+
     #updating mongoDB document with updated fields
     result = events.update_one(
         {"_id": eventId, "userId": user_id},
         {"$set": edited_event}
     )
 
+    if previous is not None and result.modified_count:
+        event_cache.invalidate(user_id, previous["start"], previous["end"])
+        event_cache.invalidate(user_id, new_start, new_end)
+
     if result.modified_count == 0:
         return func.HttpResponse(
             status_code=204
@@ -435,6 +380,7 @@ def edit_event(req: func.HttpRequest) -> func.HttpResponse:
     
 
 @bp.route(route="v1.0/deleteEvent/{id}", methods=["DELETE", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("writes")
 @jwt_required
 def delete_event(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("deleteEvent called")
@@ -474,10 +420,14 @@ def delete_event(req: func.HttpRequest) -> func.HttpResponse:
             status_code=401
         )
 
-    #deleting specified document from mongoDB
-    result = events.delete_one({"_id": eventId, "userId": user_id})
+    #deleting specified document from mongoDB, returning its window for cache invalidation
+    deleted = events.find_one_and_delete(
+        {"_id": eventId, "userId": user_id},
+        projection={"start": 1, "end": 1}
+    )
 
-    if result.deleted_count == 1:
+    if deleted is not None:
+        event_cache.invalidate(user_id, deleted["start"], deleted["end"])
         return func.HttpResponse(
             status_code=204
         )
@@ -486,4 +436,101 @@ def delete_event(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({"error": "Forbidden or event not found"}),
             mimetype="application/json",
             status_code=403
-        )
\ No newline at end of file
+        )
+
+
+@bp.route(route="v1.0/searchEvents", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("reads")
+@jwt_required
+def search_events(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info("searchEvents called")
+
+    #connecting to MongoDB
+    db = get_db()
+
+    #getting userId from the claims already decoded by jwt_required
+    claims = getattr(req, "jwt_claims", None) or {}
+
+    try:
+        user_id = ObjectId(claims.get("userId"))
+    except (InvalidId, TypeError):
+        return func.HttpResponse(
+            json.dumps({"error": "Invalid userId in token"}),
+            mimetype="application/json",
+            status_code=401
+        )
+
+    #checking search query is present
+    query = req.params.get("q")
+    if not checkString(query):
+        return func.HttpResponse(
+            json.dumps({'error': "'q' is a required parameter"}),
+            mimetype="application/json",
+            status_code=400
+        )
+
+    #checking optional parameters are valid
+    invalid_fields = []
+    query = query.strip()
+    if len(query) > SEARCH_MAX_QUERY_LENGTH:
+        invalid_fields.append('q')
+
+    order = req.params.get("order", "relevance")
+    if order not in searchOrders:
+        invalid_fields.append('order')
+
+    limit = SEARCH_DEFAULT_LIMIT
+    limitParam = req.params.get("limit")
+    if limitParam is not None:
+        try:
+            limit = int(limitParam)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= SEARCH_MAX_LIMIT:
+            invalid_fields.append('limit')
+
+    from_dt, to_dt = None, None
+    fromParam = req.params.get("from")
+    if fromParam is not None:
+        from_dt = checkDatetime(fromParam)
+        if not from_dt:
+            invalid_fields.append('from')
+    toParam = req.params.get("to")
+    if toParam is not None:
+        to_dt = checkDatetime(toParam)
+        if not to_dt:
+            invalid_fields.append('to')
+
+    after = None
+    cursorParam = req.params.get("cursor")
+    if cursorParam is not None and order in searchOrders:
+        after = decodeCursor(cursorParam, order)
+        if after is None:
+            invalid_fields.append('cursor')
+
+    if invalid_fields:
+        return func.HttpResponse(
+            json.dumps({"error": "Invalid data", "invalid": invalid_fields}),
+            mimetype="application/json",
+            status_code=400
+        )
+
+    pipeline = searchPipeline(user_id, query, order, limit, from_dt, to_dt, after)
+    results = list(db.Events.aggregate(pipeline))
+
+    #one extra result is fetched to know whether there is another page
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = nextCursor(order, results[-1])
+
+    #textScore is only needed for the cursor, it is not part of the event
+    for event in results:
+        event.pop("score", None)
+        serializeEvent(event)
+
+    return func.HttpResponse(
+        json.dumps({"results": results, "nextCursor": next_cursor}),
+        mimetype="application/json",
+        status_code=200
+    )
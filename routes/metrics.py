@@ -0,0 +1,15 @@
+import azure.functions as func
+import json
+from admission import admissionMetrics
+
+bp = func.Blueprint()
+
+
+@bp.route(route="v1.0/admissionMetrics", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+#per-worker queue depth, in-flight and shed counts for each endpoint class, requires a function key
+def admission_metrics(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps(admissionMetrics()),
+        mimetype="application/json",
+        status_code=200
+    )
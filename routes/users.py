@@ -1,5 +1,9 @@
 import azure.functions as func
 from db.mongo import get_db
+from decorators import admission_control, jwt_required
+from revocation import newTokenClaims, revokeToken, revokeAllTokens
+from bson import ObjectId
+from bson.errors import InvalidId
 import json
 import bcrypt
 import jwt
@@ -11,6 +15,7 @@ bp = func.Blueprint()
 
 
 @bp.route(route="v1.0/register", methods=["POST"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("auth")
 def registerAccount(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("register called")
 
@@ -101,6 +106,7 @@ def registerAccount(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @bp.route(route="v1.0/login", methods=["POST"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("auth")
 def login(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("login called")
 
@@ -158,7 +164,8 @@ def login(req: func.HttpRequest) -> func.HttpResponse:
         {
             "userId": str(user["_id"]),
             "user": username,
-            "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=60)
+            "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=60),
+            **newTokenClaims()
         },
         secret_key,
         algorithm="HS256"
@@ -172,6 +179,7 @@ def login(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @bp.route(route="v1.0/logout", methods=["POST"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("writes")
 def logout(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("logout called")
 
@@ -194,7 +202,7 @@ def logout(req: func.HttpRequest) -> func.HttpResponse:
         )
 
     try:
-        jwt.decode(token, secret_key, algorithms=["HS256"])
+        claims = jwt.decode(token, secret_key, algorithms=["HS256"])
     except jwt.InvalidTokenError:
         return func.HttpResponse(
             json.dumps({"error": "Invalid token"}),
@@ -202,13 +210,45 @@ def logout(req: func.HttpRequest) -> func.HttpResponse:
             status_code=401
         )
 
-    # add token to blacklist
+    # add token digest to blacklist, removed by TTL once the token expires
     db = get_db()
-    blacklist = db.blacklist
-    blacklist.insert_one({"token": token})
+    revokeToken(db, claims, token)
 
     return func.HttpResponse(
         json.dumps({"message": "Logout successful"}),
         mimetype="application/json",
         status_code=200
     )
+
+
+@bp.route(route="v1.0/logoutAll", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@admission_control("writes")
+@jwt_required
+def logout_all(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info("logoutAll called")
+
+    # get userId from claims, set by decorator
+    claims = getattr(req, "jwt_claims", None) or {}
+    try:
+        user_id = ObjectId(claims.get("userId"))
+    except (InvalidId, TypeError):
+        return func.HttpResponse(
+            json.dumps({"error": "Invalid userId in token"}),
+            mimetype="application/json",
+            status_code=401
+        )
+
+    # a single write revokes every token issued to the user so far
+    db = get_db()
+    if not revokeAllTokens(db, user_id):
+        return func.HttpResponse(
+            json.dumps({"error": "userId does not exist"}),
+            mimetype="application/json",
+            status_code=403
+        )
+
+    return func.HttpResponse(
+        json.dumps({"message": "Logged out of all sessions"}),
+        mimetype="application/json",
+        status_code=200
+    )
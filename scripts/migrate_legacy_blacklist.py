@@ -0,0 +1,15 @@
+#one-off migration of blacklist entries storing raw tokens, run once with: python scripts/migrate_legacy_blacklist.py
+#needs MONGODB_URI set to the database the function app uses
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.mongo import get_db
+from revocation import migrateLegacyBlacklist
+
+if __name__ == "__main__":
+    db = get_db()
+    before = db.blacklist.count_documents({"token": {"$exists": True}})
+    migrateLegacyBlacklist(db)
+    print("migrated %d legacy blacklist entries" % before)
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+#orders supported by searchEvents, each paged with a keyset cursor on its sort key plus _id
+#   relevance: textScore descending, ties by _id ascending
+#   date:      start descending, ties by _id descending
+searchOrders = {"relevance", "date"}
+
+#helpers to encode and decode opaque keyset pagination cursors for search
+def encodeCursor(order, key, event_id):
+    raw = json.dumps({"o": order, "k": key, "id": str(event_id)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decodeCursor(cursor, order):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if raw["o"] != order:
+            return None
+        key = float(raw["k"]) if order == "relevance" else datetime.fromisoformat(raw["k"])
+        return key, ObjectId(raw["id"])
+    except (ValueError, TypeError, KeyError, InvalidId, UnicodeError):
+        return None
+
+#helper to get the cursor continuing after the last result of a page
+def nextCursor(order, last):
+    key = last["score"] if order == "relevance" else last["start"].isoformat()
+    return encodeCursor(order, key, last["_id"])
+
+#builds the aggregation pipeline for one page of a user's search results
+#after is a decoded cursor or None, one extra result is fetched to know whether there is another page
+def searchPipeline(user_id, query, order, limit, from_dt=None, to_dt=None, after=None):
+    #the text index is prefixed by userId, so only this user's matches are scanned
+    match = {"userId": user_id, "$text": {"$search": query}}
+    if to_dt:
+        match["start"] = {"$lt": to_dt}
+    if from_dt:
+        match["end"] = {"$gt": from_dt}
+
+    if order == "relevance":
+        pipeline = [
+            {"$match": match},
+            {"$addFields": {"score": {"$meta": "textScore"}}}
+        ]
+        if after:
+            score, last_id = after
+            pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": score}},
+                {"score": score, "_id": {"$gt": last_id}}
+            ]}})
+        pipeline.append({"$sort": {"score": -1, "_id": 1}})
+    else:
+        if after:
+            start, last_id = after
+            match["$or"] = [
+                {"start": {"$lt": start}},
+                {"start": start, "_id": {"$lt": last_id}}
+            ]
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"start": -1, "_id": -1}}
+        ]
+
+    pipeline.append({"$limit": limit + 1})
+    return pipeline
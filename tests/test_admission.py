@@ -0,0 +1,142 @@
+import asyncio
+from starlette.responses import StreamingResponse
+from admission import AdmissionLimiter, AdmittedStreamingResponse, defaultBudgets, limiters
+
+
+def test_try_acquire_sheds_at_capacity_without_waiting():
+    limiter = AdmissionLimiter("t", concurrency=2, max_queue=5, timeout=10)
+    assert limiter.try_acquire() is None
+    assert limiter.try_acquire() is None
+    assert limiter.try_acquire() == "at_capacity"
+
+    limiter.release()
+    assert limiter.try_acquire() is None
+    metrics = limiter.metrics()
+    assert (metrics["inFlight"], metrics["admitted"], metrics["shedAtCapacity"]) == (2, 3, 1)
+
+
+def test_async_waiters_time_out_and_queue_is_bounded():
+    async def scenario():
+        limiter = AdmissionLimiter("t", concurrency=1, max_queue=1, timeout=0.05)
+        assert await limiter.acquire_async() is None
+        waiting = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        assert await limiter.acquire_async() == "queue_full"
+        assert await waiting == "timeout"
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    metrics = limiter.metrics()
+    assert (metrics["queueDepth"], metrics["inFlight"]) == (0, 1)
+    assert (metrics["shedQueueFull"], metrics["shedTimeout"]) == (1, 1)
+
+
+def test_release_hands_slots_to_waiters_in_order():
+    async def scenario():
+        limiter = AdmissionLimiter("t", concurrency=1, max_queue=5, timeout=1)
+        assert await limiter.acquire_async() is None
+        order = []
+
+        async def request(name):
+            assert await limiter.acquire_async() is None
+            order.append(name)
+
+        waiters = [asyncio.ensure_future(request(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        #a queued request is not overtaken by a sync request
+        assert limiter.try_acquire() == "at_capacity"
+
+        limiter.release()
+        await asyncio.sleep(0.01)
+        assert order == ["a"]
+        limiter.release()
+        await asyncio.gather(*waiters)
+        assert order == ["a", "b"]
+        limiter.release()
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.metrics()["inFlight"] == 0
+
+
+def test_slot_granted_to_a_timed_out_waiter_is_given_back():
+    async def scenario():
+        limiter = AdmissionLimiter("t", concurrency=1, max_queue=5, timeout=0.05)
+        assert await limiter.acquire_async() is None
+        waiting = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        #release picks the waiter, but its deadline passes before the grant runs on the loop
+        future = limiter._waiters[0][1]
+        limiter.release()
+        future.cancel()
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.metrics()["inFlight"] == 0
+
+
+def stream(limiter, disconnect=False):
+    async def scenario():
+        assert await limiter.acquire_async() is None
+
+        def chunks():
+            yield b"a"
+            yield b"b"
+
+        response = AdmittedStreamingResponse(
+            StreamingResponse(chunks(), media_type="text/plain", headers={"X-Test": "1"}), limiter
+        )
+        assert limiter.in_flight == 1
+        sent = []
+
+        async def receive():
+            if disconnect:
+                return {"type": "http.disconnect"}
+            await asyncio.sleep(10)
+
+        async def send(message):
+            sent.append(message)
+            if disconnect:
+                raise OSError("client went away")
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.3"}}
+        try:
+            await response(scope, receive, send)
+        except OSError:
+            pass
+        return sent
+
+    return asyncio.run(scenario())
+
+
+def test_streaming_response_holds_slot_until_body_is_sent():
+    limiter = AdmissionLimiter("t", concurrency=1, max_queue=0, timeout=1)
+    sent = stream(limiter)
+    assert b"".join(m.get("body", b"") for m in sent) == b"ab"
+    assert (b"x-test", b"1") in sent[0]["headers"]
+    assert limiter.in_flight == 0
+
+
+def test_streaming_slot_is_released_when_sending_fails():
+    limiter = AdmissionLimiter("t", concurrency=1, max_queue=0, timeout=1)
+    stream(limiter, disconnect=True)
+    assert limiter.in_flight == 0
+
+
+def test_default_budgets_leave_threads_for_reads():
+    for threads in range(1, 33):
+        budgets = defaultBudgets(threads)
+        assert budgets["reads"] >= 1
+        if threads >= 3:
+            assert budgets["auth"] + budgets["writes"] < threads
+    assert defaultBudgets(5) == {"auth": 1, "reads": 3, "writes": 1}
+
+
+def test_streaming_endpoints_do_not_share_the_thread_pool_budgets():
+    #only the bulk class queues, the pool-sized classes shed at capacity
+    assert set(limiters) == {"auth", "reads", "writes", "bulk"}
+    assert [limiters[name].max_queue for name in ("auth", "reads", "writes")] == [0, 0, 0]
+    assert limiters["bulk"].max_queue > 0
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from cache import EventWindowCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def hour(h):
+    return datetime(2026, 1, 5) + timedelta(hours=h)
+
+
+def put(cache, user, start, end, body):
+    cache.put(user, start, end, body, cache.generation(user))
+
+
+def test_get_returns_stored_body():
+    cache = EventWindowCache()
+    put(cache, "u1", hour(0), hour(24), b"[]")
+    assert cache.get("u1", hour(0), hour(24)) == b"[]"
+    assert cache.get("u1", hour(0), hour(23)) is None
+    assert cache.get("u2", hour(0), hour(24)) is None
+
+
+def test_aware_and_naive_datetimes_share_a_key():
+    cache = EventWindowCache()
+    put(cache, "u1", hour(0).replace(tzinfo=timezone.utc), hour(24).replace(tzinfo=timezone.utc), b"x")
+    assert cache.get("u1", hour(0), hour(24)) == b"x"
+
+
+def test_invalidate_only_drops_overlapping_windows_of_that_user():
+    cache = EventWindowCache()
+    put(cache, "u1", hour(0), hour(24), b"day1")
+    put(cache, "u1", hour(24), hour(48), b"day2")
+    put(cache, "u2", hour(0), hour(24), b"other")
+
+    cache.invalidate("u1", hour(10), hour(11))
+
+    assert cache.get("u1", hour(0), hour(24)) is None
+    assert cache.get("u1", hour(24), hour(48)) == b"day2"
+    assert cache.get("u2", hour(0), hour(24)) == b"other"
+
+
+def test_invalidate_treats_windows_as_half_open():
+    cache = EventWindowCache()
+    put(cache, "u1", hour(0), hour(24), b"day1")
+
+    #an event ending exactly when the window starts does not overlap it
+    cache.invalidate("u1", hour(-2), hour(0))
+    cache.invalidate("u1", hour(24), hour(25))
+    assert cache.get("u1", hour(0), hour(24)) == b"day1"
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = EventWindowCache(max_bytes=10, max_entries=2)
+    put(cache, "u1", hour(0), hour(1), b"aaa")
+    put(cache, "u1", hour(1), hour(2), b"bbb")
+    cache.get("u1", hour(0), hour(1))
+    put(cache, "u1", hour(2), hour(3), b"ccc")
+
+    assert cache.get("u1", hour(1), hour(2)) is None
+    assert cache.get("u1", hour(0), hour(1)) == b"aaa"
+
+    put(cache, "u2", hour(0), hour(1), b"dddddddd")
+    assert cache.get("u1", hour(0), hour(1)) is None
+    assert cache.get("u2", hour(0), hour(1)) == b"dddddddd"
+
+
+def test_oversized_body_is_not_cached():
+    cache = EventWindowCache(max_bytes=4)
+    put(cache, "u1", hour(0), hour(1), b"too big")
+    assert cache.get("u1", hour(0), hour(1)) is None
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = EventWindowCache(ttl=30, clock=clock)
+    put(cache, "u1", hour(0), hour(24), b"[]")
+
+    clock.now = 29
+    assert cache.get("u1", hour(0), hour(24)) == b"[]"
+    clock.now = 30
+    assert cache.get("u1", hour(0), hour(24)) is None
+
+
+def test_put_is_skipped_when_a_write_raced_the_read():
+    cache = EventWindowCache()
+    generation = cache.generation("u1")
+
+    #a write lands between the reader's db query and its put
+    cache.invalidate("u1", hour(3), hour(4))
+    cache.put("u1", hour(0), hour(24), b"stale", generation)
+    assert cache.get("u1", hour(0), hour(24)) is None
+
+    #writes for other users do not affect the generation
+    generation = cache.generation("u1")
+    cache.invalidate("u2", hour(3), hour(4))
+    cache.put("u1", hour(0), hour(24), b"fresh", generation)
+    assert cache.get("u1", hour(0), hour(24)) == b"fresh"
+
+
+def test_generation_table_reset_makes_captured_generations_stale():
+    cache = EventWindowCache(max_entries=1)
+    generation = cache.generation("u1")
+    for user in range(10):
+        cache.invalidate("other%d" % user, hour(0), hour(1))
+
+    assert len(cache._generations) <= 4
+    cache.put("u1", hour(0), hour(24), b"stale", generation)
+    assert cache.get("u1", hour(0), hour(24)) is None
@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+import ical
+
+
+def event(**fields):
+    base = {
+        "_id": "65a1f0c2e4b0a1b2c3d4e5f6",
+        "eventType": "WORKOUT",
+        "title": "Tempo run",
+        "description": None,
+        "location": None,
+        "start": datetime(2026, 3, 1, 7, 0),
+        "end": datetime(2026, 3, 1, 8, 0)
+    }
+    base.update(fields)
+    return base
+
+
+def lines(block):
+    return block.decode("utf-8").split("\r\n")
+
+
+def test_escape_text():
+    assert ical.escapeText("a,b;c\\d\ne") == "a\\,b\\;c\\\\d\\ne"
+
+
+def test_format_datetime_converts_aware_values_to_utc():
+    assert ical.formatDatetime(datetime(2026, 3, 1, 7, 0)) == "20260301T070000Z"
+    aware = datetime(2026, 7, 1, 8, 0).astimezone(timezone.utc)
+    assert ical.formatDatetime(aware).endswith("Z")
+
+
+def test_fold_line_keeps_lines_within_75_octets_and_utf8_intact():
+    folded = ical.foldLine("DESCRIPTION:" + "é" * 100)
+    parts = folded.split(b"\r\n")
+    assert parts[-1] == b""
+    assert all(len(part) <= 75 for part in parts)
+    #every part decodes on its own, so no character was split
+    for part in parts:
+        part.decode("utf-8")
+    unfolded = b"".join(part[1:] if i else part for i, part in enumerate(parts))
+    assert unfolded.decode("utf-8") == "DESCRIPTION:" + "é" * 100
+
+
+def test_format_event_includes_optional_fields_only_when_set():
+    block = lines(ical.formatEvent(event(), "20260101T000000Z"))
+    assert block[0] == "BEGIN:VEVENT"
+    assert "UID:65a1f0c2e4b0a1b2c3d4e5f6@extra-performance" in block
+    assert "DTSTART:20260301T070000Z" in block
+    assert "CATEGORIES:WORKOUT" in block
+    assert not any(line.startswith(("DESCRIPTION", "LOCATION")) for line in block)
+
+    block = lines(ical.formatEvent(event(location="Track, lane 1"), "20260101T000000Z"))
+    assert "LOCATION:Track\\, lane 1" in block
+
+
+def test_exported_event_parses_back():
+    data = ical.calendarHeader() + ical.formatEvent(event(description="6 x 1km"), "20260101T000000Z") + ical.calendarFooter()
+    parser = ical.EventParser()
+    vevents = parser.feed(data) + parser.close()
+    assert len(vevents) == 1
+    fields = ical.eventFields(vevents[0])
+    assert fields["title"] == "Tempo run"
+    assert fields["description"] == "6 x 1km"
+    assert fields["start"] == datetime(2026, 3, 1, 7, 0)
+    assert fields["end"] == datetime(2026, 3, 1, 8, 0)
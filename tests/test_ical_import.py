@@ -0,0 +1,180 @@
+from datetime import datetime
+import pytest
+import ical
+
+HORIZON = datetime(2030, 1, 1)
+
+
+def calendar(*events):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0"]
+    for event in events:
+        lines += ["BEGIN:VEVENT"] + list(event) + ["END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def parse(data, chunk_size=None):
+    parser = ical.EventParser()
+    vevents = []
+    step = chunk_size or len(data)
+    for i in range(0, len(data), step):
+        vevents += parser.feed(data[i:i + step])
+    return vevents + parser.close()
+
+
+SAMPLE = calendar(
+    [
+        "UID:run-1",
+        "SUMMARY:Tempo run\\, hard",
+        "DTSTART;TZID=Europe/London:20260701T070000",
+        "DURATION:PT1H30M",
+        "CATEGORIES:Workout",
+        "DESCRIPTION:6 x 1km at thres",
+        " hold, full recovery",
+        "BEGIN:VALARM",
+        "SUMMARY:reminder",
+        "END:VALARM",
+    ],
+    [
+        "UID:rest-1",
+        "SUMMARY:Rest day é",
+        "DTSTART;VALUE=DATE:20260702",
+    ]
+)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7, 64])
+def test_parser_is_independent_of_chunk_boundaries(chunk_size):
+    assert parse(SAMPLE, chunk_size) == parse(SAMPLE)
+
+
+def test_parser_unfolds_lines_and_skips_nested_components():
+    first, second = parse(SAMPLE, 5)
+    assert first["SUMMARY"] == ({}, "Tempo run\\, hard")
+    assert first["DESCRIPTION"][1] == "6 x 1km at threshold, full recovery"
+    assert "BEGIN" not in first
+    assert second["SUMMARY"][1] == "Rest day é"
+
+
+def test_parser_handles_bare_lf_and_missing_final_newline():
+    data = b"BEGIN:VEVENT\nUID:a\nSUMMARY:x\nEND:VEVENT"
+    assert parse(data, 3) == [{"UID": ({}, "a"), "SUMMARY": ({}, "x")}]
+
+
+@pytest.mark.parametrize("chunk_size", [None, 100])
+def test_parser_rejects_overlong_lines_even_without_newlines(chunk_size):
+    def feed(data):
+        parser = ical.EventParser(max_line=1000)
+        step = chunk_size or len(data)
+        for i in range(0, len(data), step):
+            parser.feed(data[i:i + step])
+        return parser.close()
+
+    assert feed(b"SUMMARY:" + b"x" * 990 + b"\r\n") == []
+    with pytest.raises(ValueError):
+        feed(b"x" * 1001)
+
+
+def test_parser_rejects_overlong_folded_lines():
+    parser = ical.EventParser(max_line=1000)
+    parser.feed(b"BEGIN:VEVENT\r\nDESCRIPTION:x\r\n")
+    with pytest.raises(ValueError):
+        for _ in range(20):
+            parser.feed(b" " + b"y" * 70 + b"\r\n")
+
+
+def test_parser_keeps_repeated_properties_as_lists():
+    (vevent,) = parse(calendar([
+        "UID:a", "SUMMARY:x", "DTSTART:20260105T070000Z",
+        "EXDATE:20260112T070000Z", "EXDATE:20260119T070000Z,20260126T070000Z"
+    ]))
+    assert [value for _, value in vevent["EXDATE"]] == ["20260112T070000Z", "20260119T070000Z,20260126T070000Z"]
+
+
+def test_parse_content_line_with_quoted_colon():
+    name, params, value = ical.parseContentLine('LOCATION;ALTREP="http://x.test/a":Track')
+    assert (name, params, value) == ("LOCATION", {"ALTREP": "http://x.test/a"}, "Track")
+
+
+def test_event_fields_convert_to_utc_and_apply_duration():
+    first, second = [ical.eventFields(vevent) for vevent in parse(SAMPLE)]
+    assert first["title"] == "Tempo run, hard"
+    assert first["start"] == datetime(2026, 7, 1, 6, 0)
+    assert first["end"] == datetime(2026, 7, 1, 7, 30)
+    assert first["categories"] == ["WORKOUT"]
+    #all-day events without an end last one day
+    assert (second["start"], second["end"]) == (datetime(2026, 7, 2), datetime(2026, 7, 3))
+
+
+def test_parse_duration():
+    assert ical.parseDuration("P1W2DT3H4M5S").total_seconds() == ((7 + 2) * 24 + 3) * 3600 + 4 * 60 + 5
+    assert ical.parseDuration("P") is None
+    assert ical.parseDuration("nonsense") is None
+
+
+def expand(*lines, limit=500):
+    (vevent,) = parse(calendar(lines))
+    return ical.expandEvent(vevent, HORIZON, limit)
+
+
+def test_single_event_expands_to_itself():
+    occurrences, truncated = expand("UID:a", "SUMMARY:x", "DTSTART:20260105T070000Z", "DTEND:20260105T080000Z")
+    assert len(occurrences) == 1 and not truncated
+    assert occurrences[0]["recurrenceId"] is None
+
+
+def test_weekly_series_keeps_local_time_across_dst_and_honours_exdate():
+    occurrences, truncated = expand(
+        "UID:a", "SUMMARY:x",
+        "DTSTART;TZID=Europe/London:20260317T180000", "DTEND;TZID=Europe/London:20260317T190000",
+        "RRULE:FREQ=WEEKLY;COUNT=4",
+        "EXDATE;TZID=Europe/London:20260331T180000"
+    )
+    assert not truncated
+    starts = [o["start"] for o in occurrences]
+    #18:00 GMT then 18:00 BST, with the 31st excluded
+    assert starts == [datetime(2026, 3, 17, 18), datetime(2026, 3, 24, 18), datetime(2026, 4, 7, 17)]
+    assert all((o["end"] - o["start"]).total_seconds() == 3600 for o in occurrences)
+    assert [o["recurrenceId"] for o in occurrences][1] == "20260324T180000Z"
+
+
+def test_all_day_series_with_floating_until():
+    occurrences, _ = expand(
+        "UID:a", "SUMMARY:Long run", "DTSTART;VALUE=DATE:20260104",
+        "RRULE:FREQ=WEEKLY;UNTIL=20260125"
+    )
+    assert [o["start"].day for o in occurrences] == [4, 11, 18, 25]
+    assert all((o["end"] - o["start"]).days == 1 for o in occurrences)
+
+
+def test_unbounded_series_is_truncated_at_limit_and_horizon():
+    occurrences, truncated = expand(
+        "UID:a", "SUMMARY:x", "DTSTART:20260105T070000Z", "DTEND:20260105T080000Z", "RRULE:FREQ=DAILY",
+        limit=10
+    )
+    assert truncated and len(occurrences) == 10
+
+    occurrences, truncated = expand(
+        "UID:a", "SUMMARY:x", "DTSTART:20291225T070000Z", "DTEND:20291225T080000Z", "RRULE:FREQ=DAILY"
+    )
+    assert truncated and occurrences[-1]["start"] <= HORIZON
+    assert len(occurrences) == 7
+
+
+def test_override_is_keyed_on_the_occurrence_it_replaces():
+    generated, _ = expand(
+        "UID:a", "SUMMARY:x", "DTSTART;TZID=Europe/London:20260105T070000", "DURATION:PT1H",
+        "RRULE:FREQ=WEEKLY;COUNT=3"
+    )
+    (override,), _ = expand(
+        "UID:a", "SUMMARY:moved", "RECURRENCE-ID;TZID=Europe/London:20260112T070000",
+        "DTSTART;TZID=Europe/London:20260113T070000", "DURATION:PT1H", "STATUS:CANCELLED"
+    )
+    assert override["recurrenceId"] == generated[1]["recurrenceId"]
+    assert override["start"] == datetime(2026, 1, 13, 7)
+    assert override["cancelled"]
+
+
+def test_invalid_recurrence_rule_raises_value_error():
+    with pytest.raises(ValueError):
+        expand("UID:a", "SUMMARY:x", "DTSTART:20260105T070000Z", "DTEND:20260105T080000Z", "RRULE:FREQ=SOMETIMES")
@@ -0,0 +1,105 @@
+import hashlib
+import pytest
+from bson import ObjectId
+import revocation
+from revocation import EpochCache, isRevoked, tokenDigest
+
+USER_ID = ObjectId("65a1f0c2e4b0a1b2c3d4e5f6")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCollection:
+    def __init__(self, documents=()):
+        self.documents = {document["_id"]: document for document in documents}
+        self.lookups = 0
+
+    def find_one(self, query, projection=None):
+        self.lookups += 1
+        return self.documents.get(query["_id"])
+
+
+class FakeDb:
+    def __init__(self, users=(), blacklist=()):
+        self.users = FakeCollection(users)
+        self.blacklist = FakeCollection(blacklist)
+
+
+@pytest.fixture(autouse=True)
+def epoch_cache(monkeypatch):
+    cache = EpochCache(ttl=5)
+    monkeypatch.setattr(revocation, "epoch_cache", cache)
+    return cache
+
+
+def test_epoch_cache_never_moves_backwards():
+    cache = EpochCache(ttl=5)
+    cache.store("u", 200.0)
+    #a read that started before a logout-all finishes later with the older value
+    cache.store("u", 100.0)
+    assert cache.lookup("u") == (True, 200.0)
+    cache.store("u", None)
+    assert cache.lookup("u") == (True, 200.0)
+    cache.store("u", 300.0)
+    assert cache.lookup("u") == (True, 300.0)
+
+
+def test_epoch_cache_entries_expire_after_ttl():
+    clock = Clock()
+    cache = EpochCache(ttl=5, clock=clock)
+    cache.store("u", None)
+    assert cache.lookup("u") == (True, None)
+    clock.now += 5
+    assert cache.lookup("u") == (False, None)
+    assert cache.lookup("missing") == (False, None)
+
+
+def test_epoch_cache_resets_when_full():
+    cache = EpochCache(ttl=5, max_entries=2)
+    cache.store("a", 1.0)
+    cache.store("b", 2.0)
+    #updating an existing key does not count as a new entry
+    cache.store("b", 3.0)
+    assert cache.lookup("a") == (True, 1.0)
+
+    cache.store("c", 4.0)
+    assert cache.lookup("a") == (False, None)
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("c") == (True, 4.0)
+
+
+def test_token_digest_uses_jti_and_falls_back_to_the_raw_token():
+    assert tokenDigest({"jti": "abc"}, "raw.jwt.token") == hashlib.sha256(b"abc").digest()
+    assert tokenDigest({}, "raw.jwt.token") == hashlib.sha256(b"raw.jwt.token").digest()
+    assert len(tokenDigest({"jti": "abc"}, "raw.jwt.token")) == 32
+
+
+def test_blacklisted_token_is_revoked():
+    db = FakeDb(users=[{"_id": USER_ID}], blacklist=[{"_id": tokenDigest({"jti": "abc"}, "t")}])
+    assert isRevoked(db, {"userId": str(USER_ID), "jti": "abc", "iat": 10.0}, "t")
+    assert not isRevoked(db, {"userId": str(USER_ID), "jti": "other", "iat": 10.0}, "t")
+
+
+def test_tokens_issued_before_logout_all_are_revoked():
+    db = FakeDb(users=[{"_id": USER_ID, "tokensValidAfter": 100.0}])
+    claims = {"userId": str(USER_ID), "jti": "abc"}
+    assert isRevoked(db, dict(claims, iat=99.5), "t")
+    assert not isRevoked(db, dict(claims, iat=100.0), "t")
+    #tokens issued before iat was added count as issued at 0
+    assert isRevoked(db, claims, "t")
+    #the epoch is only read once while cached
+    assert db.users.lookups == 1
+
+
+def test_users_without_logout_all_only_check_the_blacklist():
+    db = FakeDb(users=[{"_id": USER_ID}])
+    assert not isRevoked(db, {"userId": str(USER_ID), "jti": "abc"}, "t")
+    assert not isRevoked(db, {"userId": "not an id", "jti": "abc"}, "t")
+    assert db.users.lookups == 1
+    assert db.blacklist.lookups == 2
@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from search import decodeCursor, encodeCursor, nextCursor, searchPipeline
+
+USER_ID = ObjectId("65a1f0c2e4b0a1b2c3d4e5f6")
+
+
+def oid(n):
+    return ObjectId("%024x" % n)
+
+
+@pytest.mark.parametrize("order, key, expected", [
+    ("relevance", 1.75, 1.75),
+    ("date", "2026-03-01T07:00:00", datetime(2026, 3, 1, 7, 0))
+])
+def test_cursor_round_trip(order, key, expected):
+    assert decodeCursor(encodeCursor(order, key, oid(7)), order) == (expected, oid(7))
+
+
+def test_cursor_from_the_other_order_or_malformed_is_rejected():
+    assert decodeCursor(encodeCursor("date", "2026-03-01T07:00:00", oid(1)), "relevance") is None
+    assert decodeCursor(encodeCursor("relevance", 1.5, oid(1)), "date") is None
+    assert decodeCursor("not base64!", "date") is None
+    assert decodeCursor(base64.urlsafe_b64encode(b"[1, 2]").decode(), "date") is None
+    bad_id = json.dumps({"o": "date", "k": "2026-03-01T07:00:00", "id": "nope"}).encode()
+    assert decodeCursor(base64.urlsafe_b64encode(bad_id).decode(), "date") is None
+    bad_key = json.dumps({"o": "relevance", "k": "high", "id": str(oid(1))}).encode()
+    assert decodeCursor(base64.urlsafe_b64encode(bad_key).decode(), "relevance") is None
+
+
+#minimal evaluation of the predicates the keyset stages use
+def matches(doc, predicate):
+    if "$or" in predicate:
+        if not any(matches(doc, branch) for branch in predicate["$or"]):
+            return False
+    for field, condition in predicate.items():
+        if field.startswith("$"):
+            continue
+        if isinstance(condition, dict):
+            if "$lt" in condition and not doc[field] < condition["$lt"]:
+                return False
+            if "$gt" in condition and not doc[field] > condition["$gt"]:
+                return False
+        elif doc[field] != condition:
+            return False
+    return True
+
+
+def page(docs, pipeline):
+    #applies every stage after the text match, which the documents are assumed to pass
+    results = list(docs)
+    for stage in pipeline:
+        if "$match" in stage:
+            results = [doc for doc in results if matches(doc, stage["$match"])]
+        elif "$sort" in stage:
+            for field, direction in reversed(list(stage["$sort"].items())):
+                results.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        elif "$limit" in stage:
+            results = results[:stage["$limit"]]
+    return results
+
+
+def pageThrough(docs, order, limit):
+    seen = []
+    after = None
+    while True:
+        pipeline = searchPipeline(USER_ID, "run", order, limit, after=after)
+        results = page(docs, pipeline)
+        seen += [doc["_id"] for doc in results[:limit]]
+        if len(results) <= limit:
+            return seen
+        after = decodeCursor(nextCursor(order, results[limit - 1]), order)
+
+
+def test_relevance_pages_follow_score_desc_then_id_asc():
+    docs = [{"_id": oid(n), "score": score, "userId": USER_ID} for n, score in
+            [(1, 2.0), (2, 1.0), (3, 2.0), (4, 2.0), (5, 1.0), (6, 3.0)]]
+    expected = [oid(n) for n in (6, 1, 3, 4, 2, 5)]
+    for limit in (1, 2, 4):
+        assert pageThrough(docs, "relevance", limit) == expected
+
+    pipeline = searchPipeline(USER_ID, "run", "relevance", 2, after=(2.0, oid(3)))
+    assert pipeline[-2] == {"$sort": {"score": -1, "_id": 1}}
+
+
+def test_date_pages_follow_start_desc_then_id_desc():
+    early, late = datetime(2026, 3, 1, 7), datetime(2026, 3, 2, 7)
+    docs = [{"_id": oid(n), "start": start, "userId": USER_ID} for n, start in
+            [(1, late), (2, early), (3, late), (4, early), (5, late)]]
+    expected = [oid(n) for n in (5, 3, 1, 4, 2)]
+    for limit in (1, 2, 3):
+        assert pageThrough(docs, "date", limit) == expected
+
+    pipeline = searchPipeline(USER_ID, "run", "date", 2, after=(late, oid(3)))
+    assert pipeline[-2] == {"$sort": {"start": -1, "_id": -1}}
+
+
+def test_pipeline_filters_on_user_window_and_fetches_one_extra():
+    from_dt, to_dt = datetime(2026, 3, 1), datetime(2026, 4, 1)
+    pipeline = searchPipeline(USER_ID, "tempo", "date", 20, from_dt, to_dt)
+    assert pipeline[0]["$match"] == {
+        "userId": USER_ID,
+        "$text": {"$search": "tempo"},
+        "start": {"$lt": to_dt},
+        "end": {"$gt": from_dt}
+    }
+    assert pipeline[-1] == {"$limit": 21}
@@ -0,0 +1,112 @@
+from datetime import datetime
+from bson import ObjectId
+from validation import compileSchema, createErrorBody, editErrorBody, validateCreateEvent, validateEditEvent
+
+
+def payload(**fields):
+    base = {
+        "eventType": " WORKOUT ",
+        "title": "  Tempo run ",
+        "start": "2026-03-01T07:00:00Z",
+        "end": "2026-03-01T08:00:00+01:00"
+    }
+    base.update(fields)
+    return {name: value for name, value in base.items() if value is not ...}
+
+
+def test_valid_create_payload_is_cleaned():
+    clean, missing, invalid = validateCreateEvent(payload(end="2026-03-01T09:00:00+01:00"))
+    assert (missing, invalid) == ([], {})
+    assert clean == {
+        "eventType": "WORKOUT",
+        "title": "Tempo run",
+        "start": datetime(2026, 3, 1, 7, 0),
+        "end": datetime(2026, 3, 1, 8, 0)
+    }
+
+
+def test_create_reports_missing_and_invalid_in_one_pass():
+    clean, missing, invalid = validateCreateEvent(payload(end=..., title="   ", eventType="RACE"))
+    assert missing == ["end"]
+    assert invalid == {"title": "Invalid string", "eventType": "Invalid choice"}
+
+
+def test_end_must_be_after_start():
+    #08:00+01:00 is 07:00 UTC, the same instant as start
+    _, _, invalid = validateCreateEvent(payload())
+    assert invalid == {"end": "end must be after start"}
+
+    #ordering is not checked when either side is itself invalid
+    _, _, invalid = validateCreateEvent(payload(start="not a date"))
+    assert invalid == {"start": "Invalid date"}
+
+
+def test_create_optional_fields_are_lenient_except_malformed_ids():
+    clean, _, invalid = validateCreateEvent(payload(
+        end="2026-03-01T09:00:00Z", description=5, location="  ", workoutLogId="65a1f0c2e4b0a1b2c3d4e5f6"
+    ))
+    assert invalid == {}
+    assert clean["description"] is None and clean["location"] is None
+    assert clean["workoutLogId"] == ObjectId("65a1f0c2e4b0a1b2c3d4e5f6")
+
+    _, _, invalid = validateCreateEvent(payload(end="2026-03-01T09:00:00Z", workoutLogId="nope"))
+    assert invalid == {"workoutLogId": "workoutLogId is invalid"}
+
+
+def test_create_accepts_datetime_objects_from_import():
+    _, _, invalid = validateCreateEvent(payload(start=datetime(2026, 3, 1, 7), end=datetime(2026, 3, 1, 8)))
+    assert invalid == {}
+
+
+def test_edit_rejects_unknown_fields_and_only_allows_null_workout_log():
+    clean, missing, invalid = validateEditEvent({
+        "title": "x", "description": None, "workoutLogId": "65a1f0c2e4b0a1b2c3d4e5f6", "colour": "red"
+    })
+    assert missing == []
+    assert clean == {"title": "x", "description": None}
+    assert set(invalid) == {"workoutLogId", "colour"}
+
+    clean, _, invalid = validateEditEvent({"workoutLogId": None, "location": None})
+    assert invalid == {} and clean == {"workoutLogId": None, "location": None}
+
+
+def test_edit_checks_ordering_only_when_both_dates_are_sent():
+    _, _, invalid = validateEditEvent({"end": "2026-03-01T06:00:00Z"})
+    assert invalid == {}
+    _, _, invalid = validateEditEvent({"start": "2026-03-01T07:00:00Z", "end": "2026-03-01T06:00:00Z"})
+    assert invalid == {"end": "end must be after start"}
+
+
+def test_compiled_schema_supports_custom_messages_and_required_fields():
+    validate = compileSchema({
+        "name": {"type": "string", "required": True, "message": "Name required"},
+        "kind": {"type": "choice", "choices": ["a", "b"], "nullable": True}
+    }, allowUnknown=False)
+    assert validate({"name": 1, "kind": None}) == ({"kind": None}, [], {"name": "Name required"})
+    assert validate({"kind": "c", "extra": 1}) == ({}, ["name"], {"extra": "Unknown field", "kind": "Invalid choice"})
+
+
+def test_create_error_body_keeps_previous_keys_and_adds_details():
+    _, missing, invalid = validateCreateEvent(payload(end=..., title="   "))
+    assert createErrorBody(missing, invalid) == {
+        "error": "Missing data", "missing": ["end"], "invalid": ["title"], "details": {"title": "Invalid string"}
+    }
+
+    _, missing, invalid = validateCreateEvent(payload(eventType="RACE"))
+    body = createErrorBody(missing, invalid)
+    assert (body["error"], body["invalid"]) == ("Invalid data", ["eventType", "end"])
+
+    _, missing, invalid = validateCreateEvent(payload())
+    assert createErrorBody(missing, invalid)["error"] == "event end must be after start"
+
+
+def test_edit_error_body_lists_unknown_fields_by_name():
+    _, _, invalid = validateEditEvent({"title": "", "colour": "red"})
+    assert editErrorBody(invalid) == {
+        "error": "Invalid fields submitted",
+        "invalid": ["colour"],
+        "details": {"colour": "Unknown field", "title": "Invalid string"}
+    }
+
+    _, _, invalid = validateEditEvent({"title": ""})
+    assert editErrorBody(invalid)["invalid"] == {"title": "Invalid string"}
@@ -0,0 +1,195 @@
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+
+eventTypes = ["STANDARD", "WORKOUT"]
+
+#declarative field specs, compiled once by compileSchema
+#   type:        "string", "choice", "datetime", "objectId" or "null"
+#   required:    field must be present
+#   nullable:    None is accepted and stored as None
+#   blankAsNull: non-strings and blank strings are stored as None instead of being rejected
+#   after:       datetime must be later than the named field
+#   message:     overrides the default error message
+createEventSchema = {
+    "eventType": {"type": "choice", "choices": eventTypes, "required": True},
+    "title": {"type": "string", "required": True},
+    "start": {"type": "datetime", "required": True},
+    "end": {"type": "datetime", "required": True, "after": "start"},
+    "description": {"type": "string", "blankAsNull": True},
+    "location": {"type": "string", "blankAsNull": True},
+    "workoutLogId": {"type": "objectId", "blankAsNull": True, "message": "workoutLogId is invalid"}
+}
+
+editEventSchema = {
+    "eventType": {"type": "choice", "choices": eventTypes},
+    "title": {"type": "string"},
+    "start": {"type": "datetime"},
+    "end": {"type": "datetime", "after": "start"},
+    "description": {"type": "string", "nullable": True},
+    "location": {"type": "string", "nullable": True},
+    "workoutLogId": {"type": "null", "message": "workoutLogId cannot be edited, can only be set to null"}
+}
+
+
+def _stringCheck(spec):
+    message = spec.get("message", "Invalid string")
+
+    def check(value):
+        if isinstance(value, str):
+            value = value.strip()
+            if value:
+                return value, None
+        return None, message
+    return check
+
+def _choiceCheck(spec):
+    message = spec.get("message", "Invalid choice")
+    choices = frozenset(spec["choices"])
+
+    def check(value):
+        if isinstance(value, str):
+            value = value.strip()
+            if value in choices:
+                return value, None
+        return None, message
+    return check
+
+def _datetimeCheck(spec):
+    message = spec.get("message", "Invalid date")
+    fromisoformat = datetime.fromisoformat
+    utc = timezone.utc
+
+    #datetimes are normalised to naive UTC, which is how MongoDB stores them
+    def check(value):
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                return None, message
+            if value[-1] == "Z":
+                value = value[:-1] + "+00:00"
+            try:
+                value = fromisoformat(value)
+            except ValueError:
+                return None, message
+        elif not isinstance(value, datetime):
+            return None, message
+        if value.tzinfo is not None:
+            value = value.astimezone(utc).replace(tzinfo=None)
+        return value, None
+    return check
+
+def _objectIdCheck(spec):
+    message = spec.get("message", "Invalid objectId")
+
+    def check(value):
+        if isinstance(value, ObjectId):
+            return value, None
+        if isinstance(value, str):
+            try:
+                return ObjectId(value.strip()), None
+            except InvalidId:
+                pass
+        return None, message
+    return check
+
+def _nullCheck(spec):
+    message = spec.get("message", "Must be null")
+
+    def check(value):
+        if value is None:
+            return None, None
+        return None, message
+    return check
+
+fieldChecks = {
+    "string": _stringCheck,
+    "choice": _choiceCheck,
+    "datetime": _datetimeCheck,
+    "objectId": _objectIdCheck,
+    "null": _nullCheck
+}
+
+def compileField(spec):
+    check = fieldChecks[spec["type"]](spec)
+
+    if spec.get("blankAsNull"):
+        def checkBlankAsNull(value):
+            if not isinstance(value, str) or not value.strip():
+                return None, None
+            return check(value)
+        return checkBlankAsNull
+
+    if spec.get("nullable"):
+        def checkNullable(value):
+            if value is None:
+                return None, None
+            return check(value)
+        return checkNullable
+
+    return check
+
+
+def afterMessage(name, other):
+    return "%s must be after %s" % (name, other)
+
+
+#helpers to build the 400 bodies for failed validation in the shape clients already parse
+#details is added alongside, mapping every invalid field to its message
+def createErrorBody(missing, invalid):
+    if missing:
+        body = {"error": "Missing data", "missing": missing}
+    elif list(invalid) == ["end"] and invalid["end"] == afterMessage("end", "start"):
+        body = {"error": "event end must be after start"}
+    else:
+        body = {"error": "Invalid data"}
+    if invalid:
+        #invalid has always been a list of field names for create
+        body["invalid"] = list(invalid)
+    body["details"] = invalid
+    return body
+
+def editErrorBody(invalid):
+    #unknown fields are listed by name, as before, otherwise invalid maps field -> message
+    unknown = [field for field in invalid if field not in editEventSchema]
+    return {"error": "Invalid fields submitted", "invalid": unknown or invalid, "details": invalid}
+
+
+def compileSchema(schema, allowUnknown=True):
+    #compiles a schema into validate(data) -> (clean, missing, invalid)
+    #missing is a list of absent required fields, invalid maps field -> error message
+    fields = tuple((name, compileField(spec), spec.get("required", False)) for name, spec in schema.items())
+    ordering = tuple((name, spec["after"]) for name, spec in schema.items() if "after" in spec)
+    known = frozenset(schema)
+
+    def validate(data):
+        clean = {}
+        missing = []
+        invalid = {}
+
+        if not allowUnknown:
+            for field in data:
+                if field not in known:
+                    invalid[field] = "Unknown field"
+
+        for name, check, required in fields:
+            if name not in data:
+                if required:
+                    missing.append(name)
+                continue
+            value, error = check(data[name])
+            if error:
+                invalid[name] = error
+            else:
+                clean[name] = value
+
+        for name, other in ordering:
+            if name in clean and other in clean and clean[name] <= clean[other]:
+                invalid[name] = afterMessage(name, other)
+
+        return clean, missing, invalid
+    return validate
+
+
+validateCreateEvent = compileSchema(createEventSchema)
+validateEditEvent = compileSchema(editEventSchema, allowUnknown=False)